@@ -17,10 +17,10 @@ Usage example:
 import argparse
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
-import svgwrite
 
 
 def parse_args():
@@ -41,6 +41,8 @@ def parse_args():
                    help="Ignore contours smaller than this area in pixels (default: 50).")
     p.add_argument("--debug", action="store_true",
                help="Save debug PNGs of intermediate masks.")
+    p.add_argument("--debug-compress", action="store_true",
+               help="Compress debug PNGs (default: stored uncompressed for speed).")
     return p.parse_args()
 
 
@@ -84,22 +86,48 @@ def simplify_contour(contour, factor):
     return approx
 
 
+def contour_areas(contours):
+    """
+    Return the absolute area of every (non-empty) contour via the shoelace
+    formula, computed for all contours in one vectorized pass.
+    Matches cv2.contourArea without one OpenCV call per contour.
+    """
+    if len(contours) == 0:
+        return np.zeros(0)
+
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.intp, count=len(contours))
+    starts = np.cumsum(lengths) - lengths
+    pts = np.concatenate([c.reshape(-1, 2) for c in contours]).astype(np.float64)
+
+    # Index of the next vertex, wrapping around at the end of each contour
+    nxt = np.arange(1, len(pts) + 1)
+    nxt[starts + lengths - 1] = starts
+
+    x, y = pts[:, 0], pts[:, 1]
+    cross = x * y[nxt] - x[nxt] * y
+    return np.abs(np.add.reduceat(cross, starts)) * 0.5
+
+
 def contour_to_path_d(contour):
     """
     Convert a contour (Nx1x2 array) into an SVG path string.
     Assumes image coordinates (origin top-left, y down) which is fine for SVG.
+    The result only ever contains digits, '-', '.', ',', spaces and M/L/Z, so
+    it is safe to write into an attribute verbatim without XML escaping.
     """
-    pts = contour.reshape(-1, 2)
-    if len(pts) == 0:
+    pts = np.asarray(contour).reshape(-1, 2)
+    n = len(pts)
+    if n == 0:
         return ""
 
-    d = []
-    x0, y0 = pts[0]
-    d.append(f"M {float(x0):.2f},{float(y0):.2f}")
-    for x, y in pts[1:]:
-        d.append(f"L {float(x):.2f},{float(y):.2f}")
-    d.append("Z")
-    return " ".join(d)
+    # OpenCV contours are int32 pixel coordinates, where "%.2f" would only
+    # ever add ".00"; format those as plain integers.
+    num = "%d" if pts.dtype.kind in "iu" else "%.2f"
+
+    # Format the whole contour with a single %-operation instead of one
+    # f-string per vertex.
+    fmt = f"M {num},{num} " + f"L {num},{num} " * (n - 1) + "Z"
+    return fmt % tuple(pts.ravel().tolist())
 
 def write_meta_scad(meta_path: str, w_u: float, h_u: float) -> None:
     """
@@ -118,12 +146,7 @@ def bbox_from_polys(polys):
       - OpenCV contours: [list([ [x,y], ... ]), ...] with extra nesting
     Returns: min_x, min_y, max_x, max_y
     """
-    min_x = float("inf")
-    min_y = float("inf")
-    max_x = float("-inf")
-    max_y = float("-inf")
-
-    n_points = 0
+    arrays = []
 
     for poly in polys:
         if poly is None:
@@ -140,123 +163,85 @@ def bbox_from_polys(polys):
         else:
             # Fall back: try iterating as (x,y) pairs
             try:
-                for pt in poly:
-                    x, y = pt
-                    min_x = min(min_x, float(x))
-                    min_y = min(min_y, float(y))
-                    max_x = max(max_x, float(x))
-                    max_y = max(max_y, float(y))
-                    n_points += 1
-                continue
+                arr = np.array([(float(x), float(y)) for x, y in poly], dtype=float).reshape(-1, 2)
             except Exception as e:
                 raise TypeError(f"Unsupported contour/polygon format: {type(poly)} shape={getattr(arr, 'shape', None)}") from e
 
-        # Fast path for numpy arrays
-        xs = arr[:, 0].astype(float)
-        ys = arr[:, 1].astype(float)
-        min_x = min(min_x, float(xs.min()))
-        min_y = min(min_y, float(ys.min()))
-        max_x = max(max_x, float(xs.max()))
-        max_y = max(max_y, float(ys.max()))
-        n_points += arr.shape[0]
+        arrays.append(arr)
 
-    if n_points == 0:
+    if sum(len(a) for a in arrays) == 0:
         raise ValueError("bbox_from_polys: empty polygon/contour list")
 
+    # Single reduction over all points instead of four per polygon. Reduce in
+    # the contours' own dtype (int32 from OpenCV) and only cast the scalars;
+    # a lone polygon is used as-is rather than copied by concatenate.
+    pts = arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+    min_x, min_y = (float(v) for v in pts.min(axis=0))
+    max_x, max_y = (float(v) for v in pts.max(axis=0))
+
     return min_x, min_y, max_x, max_y
 
 
-def create_svg(width, height, outline_contours, detail_contours, output_path):
+def write_svg_fast(width, height, groups, output_path):
+    """
+    Stream an SVG made only of <path> elements straight to a buffered file,
+    without building a DOM or the whole document in memory.
+
+    groups: list of (group_attrs, paths) where group_attrs is the attribute
+    string for a wrapping <g> (None to emit the paths at top level) and
+    paths is an iterable of (d, path_attrs) tuples. `d` is written verbatim
+    (no XML escaping), as produced by contour_to_path_d.
+    """
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" '
+                'xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+                f'version="1.1" width="{width}px" height="{height}px" '
+                f'viewBox="0 0 {width} {height}">')
+        for group_attrs, paths in groups:
+            if group_attrs is not None:
+                f.write(f"<g {group_attrs}>")
+            for d, path_attrs in paths:
+                f.write('<path d="')
+                f.write(d)
+                f.write(f'" {path_attrs}/>')
+            if group_attrs is not None:
+                f.write("</g>")
+        f.write("</svg>\n")
+
+
+def create_svg(width, height, outline_ds, detail_ds, output_path):
     """
-    Generate layered SVG using svgwrite with:
+    Generate layered SVG from precomputed path 'd' strings with:
     - outline layer
     - detail layer
     """
-    dwg = svgwrite.Drawing(output_path,
-                           size=(f"{width}px", f"{height}px"),
-                           viewBox=f"0 0 {width} {height}",
-                           debug=False)
-    # Inkscape layer namespace
-    dwg.attribs["xmlns:inkscape"] = "http://www.inkscape.org/namespaces/inkscape"
-
-    # Outline layer
-    outline_group = dwg.g(id="outline",
-                          **{"inkscape:groupmode": "layer",
-                             "inkscape:label": "outline"})
-    for cnt in outline_contours:
-        d = contour_to_path_d(cnt)
-        if not d:
-            continue
-        path = dwg.path(d=d,
-                        fill="none",
-                        stroke="black",
-                        stroke_width=1)
-        outline_group.add(path)
-    dwg.add(outline_group)
-
-    # Detail layer
-    detail_group = dwg.g(id="detail",
-                         **{"inkscape:groupmode": "layer",
-                            "inkscape:label": "detail"})
-    for cnt in detail_contours:
-        d = contour_to_path_d(cnt)
-        if not d:
-            continue
-        path = dwg.path(d=d,
-                        fill="none",
-                        stroke="black",
-                        stroke_width=1)
-        detail_group.add(path)
-    dwg.add(detail_group)
-
-    dwg.save()
+    stroke = 'fill="none" stroke="black" stroke-width="1"'
+    groups = []
+    for name, ds in (("outline", outline_ds), ("detail", detail_ds)):
+        # One compound path (a subpath per contour) per layer keeps the DOM small
+        d_all = " ".join(d for d in ds if d)
+        groups.append((
+            f'id="{name}" inkscape:groupmode="layer" inkscape:label="{name}"',
+            [(d_all, stroke)] if d_all else [],
+        ))
+
+    write_svg_fast(width, height, groups, output_path)
     print(f"Saved layered SVG to: {output_path}")
 
-def write_svg_single_group(width, height, contours, output_path):
-    import svgwrite
-    dwg = svgwrite.Drawing(
-        output_path,
-        size=(f"{width}px", f"{height}px"),
-        viewBox=f"0 0 {width} {height}",
-        profile="full",
-        debug=False,
-    )
-
+def write_svg_single_group(width, height, ds, output_path):
     # Filled shapes work best for OpenSCAD import
-    for cnt in contours:
-        d = contour_to_path_d(cnt)
-        if not d:
-            continue
-        dwg.add(dwg.path(d=d, fill="black", stroke="none"))
-    dwg.save()
-
-def contours_to_compound_path_d(contours):
-    """Concatenate multiple contours into one SVG path 'd' with multiple subpaths."""
-    parts = []
-    for cnt in contours:
-        d = contour_to_path_d(cnt)
-        if d:
-            parts.append(d)
-    return " ".join(parts)
-
-def write_svg_detail_evenodd(width, height, contours, output_path):
-    import svgwrite
-    dwg = svgwrite.Drawing(
-        output_path,
-        size=(f"{width}px", f"{height}px"),
-        viewBox=f"0 0 {width} {height}",
-        profile="full",
-        debug=False,
-    )
+    paths = ((d, 'fill="black" stroke="none"') for d in ds if d)
+    write_svg_fast(width, height, [(None, paths)], output_path)
 
-    d = contours_to_compound_path_d(contours)
+def write_svg_detail_evenodd(width, height, ds, output_path):
+    paths = []
+    # Concatenate all contours into one path 'd' with multiple subpaths
+    d = " ".join(d for d in ds if d)
     if d:
-        p = dwg.path(d=d, fill="black", stroke="none")
-        # This is the key: keeps holes as holes
-        p.update({"fill-rule": "evenodd"})
-        dwg.add(p)
-
-    dwg.save()
+        # fill-rule evenodd is the key: keeps holes as holes
+        paths.append((d, 'fill="black" stroke="none" fill-rule="evenodd"'))
+    write_svg_fast(width, height, [(None, paths)], output_path)
 
 
 def main():
@@ -265,8 +250,9 @@ def main():
     img_gray = load_grayscale(args.input)
     h, w = img_gray.shape[:2]
 
-    # Sanity: force to uint8 just in case
-    img_gray = img_gray.astype("uint8")
+    # Sanity: force to uint8 just in case (IMREAD_GRAYSCALE already gives
+    # uint8, so this is normally a no-op rather than a full copy)
+    img_gray = img_gray.astype(np.uint8, copy=False)
 
     # --- 1) BLACK → cookie silhouette (outline) ---
 
@@ -277,20 +263,39 @@ def main():
         img_gray, args.threshold, 255, cv2.THRESH_BINARY_INV
     )
 
+    # white_mask: 255 where pixel is "white-ish" (background + interior), 0 elsewhere.
+    # This is the exact complement of the undilated shape_mask, so take it now
+    # instead of thresholding the image a second time.
+    white_mask = cv2.bitwise_not(shape_mask)
+
     # Optional: a little dilation can close tiny gaps
     if args.outline_offset > 0:
         kernel_size = max(1, args.outline_offset * 2 + 1)
-        kernel = np.ones((kernel_size, kernel_size), np.uint8)
-        shape_mask = cv2.dilate(shape_mask, kernel, iterations=1)
+        # A square dilation is a horizontal then a vertical 1-D dilation,
+        # O(K) per pixel instead of O(K^2)
+        kernel_h = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, 1))
+        kernel_v = cv2.getStructuringElement(cv2.MORPH_RECT, (1, kernel_size))
+        shape_mask = cv2.dilate(shape_mask, kernel_h, iterations=1)
+        shape_mask = cv2.dilate(shape_mask, kernel_v, dst=shape_mask, iterations=1)
 
     # Find external contours on the black-region mask
     outline_contours, _ = find_contours(shape_mask, cv2.RETR_EXTERNAL)
 
     outline_contours_filtered = []
-    silhouette_mask = np.zeros((h, w), dtype=np.uint8)
+
+    # shape_mask is done once its contours are extracted, so reuse its buffer
+    # for the silhouette instead of allocating another HxW image (debug mode
+    # still wants to dump it, so keep it around there).
+    if args.debug:
+        silhouette_mask = np.zeros((h, w), dtype=np.uint8)
+    else:
+        silhouette_mask = shape_mask
+        silhouette_mask.fill(0)
 
     if outline_contours:
-        # Take the single largest black region as the cookie
+        # Take the single largest black region as the cookie. contourArea is the
+        # area enclosed by the outline, so a thin outline ring still wins over
+        # solid shapes drawn inside it.
         largest = max(outline_contours, key=cv2.contourArea)
         cnt_simplified = simplify_contour(largest, args.simplify)
         outline_contours_filtered.append(cnt_simplified)
@@ -308,31 +313,24 @@ def main():
 
     # --- 2) WHITE INSIDE silhouette → detail ---
 
-    # white_mask: 255 where pixel is "white-ish" (background + interior), 0 elsewhere
-    _, white_mask = cv2.threshold(
-        img_gray, args.threshold, 255, cv2.THRESH_BINARY
-    )
+    # Keep only white that lies inside the cookie silhouette (in place, white_mask
+    # isn't needed on its own afterwards)
+    white_inside = cv2.bitwise_and(white_mask, silhouette_mask, dst=white_mask)
 
-    # Keep only white that lies inside the cookie silhouette
-    white_inside = cv2.bitwise_and(white_mask, silhouette_mask)
-
-    # Shrink detail so it's smaller than outline (1px erosion to start)
-    detail_kernel = np.ones((3, 3), np.uint8)
-    white_inside_eroded = cv2.erode(white_inside, detail_kernel, iterations=0)
-
-        # Extract detail contours: filled white islands inside the cookie.
-    # Use RETR_TREE so we don't lose nested structure, and don't simplify
-    # (or simplify very lightly) so we keep fine features.
+    # Extract detail contours: filled white islands inside the cookie.
+    # RETR_CCOMP still returns every outer boundary and hole, which is all the
+    # even-odd fill needs, without building the full RETR_TREE nesting.
+    # Don't simplify (or simplify very lightly) so we keep fine features.
     detail_contours, detail_hierarchy = find_contours(
-        white_inside_eroded, cv2.RETR_TREE
+        white_inside, cv2.RETR_CCOMP
     )
 
+    # Drop truly tiny specks up front so only the survivors get simplified
+    detail_areas = contour_areas(detail_contours)
+    detail_contours = [cnt for cnt, area in zip(detail_contours, detail_areas) if area >= 2.0]
+
     detail_contours_filtered = []
     for cnt in detail_contours:
-        area = cv2.contourArea(cnt)
-        if area < 2.0:
-            continue  # ignore only truly tiny specks
-
         # Either don't simplify at all:
         # detail_contours_filtered.append(cnt)
 
@@ -352,27 +350,45 @@ def main():
         dbg[ silhouette_mask == 255 ] = (0, 0, 255)
 
         # green = interior white detail
-        dbg[ white_inside_eroded == 255 ] = (0, 255, 0)
-
-        cv2.imwrite("debug_shape_mask.png", shape_mask)
-        cv2.imwrite("debug_silhouette_mask.png", silhouette_mask)
-        cv2.imwrite("debug_white_inside.png", white_inside)
-        cv2.imwrite("debug_white_inside_eroded.png", white_inside_eroded)
-        cv2.imwrite("debug_overlay.png", dbg)
+        dbg[ white_inside == 255 ] = (0, 255, 0)
+
+        # zlib level 0 (store) is far faster than OpenCV's default level 3
+        png_params = [] if args.debug_compress else [cv2.IMWRITE_PNG_COMPRESSION, 0]
+        cv2.imwrite("debug_shape_mask.png", shape_mask, png_params)
+        cv2.imwrite("debug_silhouette_mask.png", silhouette_mask, png_params)
+        cv2.imwrite("debug_white_inside.png", white_inside, png_params)
+        cv2.imwrite("debug_overlay.png", dbg, png_params)
         print("Wrote debug_* PNGs in current directory.")
 
     # --- 4) Create SVG ---
 
-    create_svg(w, h, outline_contours_filtered, detail_contours_filtered, args.output) # create the combined SVG
-    
+    # Format each contour's path data once and share it between all writers
+    outline_ds = [contour_to_path_d(cnt) for cnt in outline_contours_filtered]
+    detail_ds = [contour_to_path_d(cnt) for cnt in detail_contours_filtered]
+
     base = os.path.splitext(args.output)[0]
-    write_svg_single_group(w, h, outline_contours_filtered, base + "_outline.svg")
-    write_svg_detail_evenodd(w, h, detail_contours_filtered,  base + "_detail.svg")
+
+    # The three files are independent, so overlap their writes
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futures = [
+            ex.submit(create_svg, w, h, outline_ds, detail_ds, args.output), # create the combined SVG
+            ex.submit(write_svg_single_group, w, h, outline_ds, base + "_outline.svg"),
+            ex.submit(write_svg_detail_evenodd, w, h, detail_ds, base + "_detail.svg"),
+        ]
+        for fut in futures:
+            fut.result()  # re-raise any write error
     print("Wrote:", base + "_outline.svg", "and", base + "_detail.svg")
 
-    min_x, min_y, max_x, max_y = bbox_from_polys(outline_contours_filtered)
-    art_w_u = max_x - min_x
-    art_h_u = max_y - min_y
+    if len(outline_contours_filtered) == 1:
+        # The usual single outline: one C-level pass. boundingRect counts
+        # pixels inclusively, so subtract 1 to get max - min like below.
+        _, _, bw, bh = cv2.boundingRect(outline_contours_filtered[0])
+        art_w_u = float(bw - 1)
+        art_h_u = float(bh - 1)
+    else:
+        min_x, min_y, max_x, max_y = bbox_from_polys(outline_contours_filtered)
+        art_w_u = max_x - min_x
+        art_h_u = max_y - min_y
 
     meta_path = f"{base}_meta.scad"
     write_meta_scad(meta_path, art_w_u, art_h_u)